@@ -34,8 +34,7 @@ l = [
     # Basic experiment
     LoopInfo(
         loop_n = 0,
-        condition_probabilities = [0.6, 0.2, 0.2],
-        n_trials_per_block = 45,
+        condition_counts = [27, 9, 9],
         n_blocks = 6,
         n_tracked=4,
     ),
@@ -43,8 +42,7 @@ l = [
     # Routine to test ceiling performance
     LoopInfo(
         loop_n = 1,
-        condition_probabilities = [0.6, 0.2, 0.2],
-        n_trials_per_block = 45,
+        condition_counts = [27, 9, 9],
         n_blocks = 2,
         n_tracked = 1,
     )
@@ -1,15 +1,16 @@
 """ Module for supporting callables which can be used for general purpose. These callables DON'T rely on _all_vars.  """
 
-from .general_functions import rand_seed, record_framedrops, Neut
-from .data_utils import flatten, recursive_unpack_class, json_compatibalise, write_file, dict_pack, dict_unpack
+from .general_functions import rand_seed, record_framedrops
+from .data_utils import flatten, recursive_unpack_class, json_compatibalise, write_file, dict_pack, dict_unpack, shallow_asdict
 from .objects import Stim, Text, Partitions
 
 from .fade import Fade
 from .flash import Flash
 from .listen import Listen
+from .file_writer import FileWriter
 
 from .presets import device_presets
 from .setting_dataclasses import *
-from .handlers import ExpHandler, ExpHandler, LoopHandler
+from .handlers import ExpHandler, LoopHandler
 
-__all__ = ['Fade', 'Flash', 'Listen', 'ExpHandler', 'flatten', 'Stim', 'Text', 'Partitions', 'moveStimuli', 'calcStartData', 'presets', 'recursive_unpack_class', 'write_file', 'json_compatibalise', 'dict_pack', 'dict_unpack', 'rand_seed', 'record_framedrops']
\ No newline at end of file
+__all__ = ['Fade', 'Flash', 'Listen', 'FileWriter', 'ExpHandler', 'flatten', 'Stim', 'Text', 'Partitions', 'calcStartData', 'presets', 'recursive_unpack_class', 'write_file', 'json_compatibalise', 'dict_pack', 'dict_unpack', 'shallow_asdict', 'rand_seed', 'record_framedrops']
\ No newline at end of file
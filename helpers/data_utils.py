@@ -6,19 +6,25 @@ import yaml
 import numpy as np
 import pickle as pkl
 import json
-from dataclasses import asdict, is_dataclass
+from array import array
+from dataclasses import asdict, is_dataclass, fields
 from typing import Union
 
 def flatten(l):
-    """ Iterates through d.values(), including through lists and sub-dictionaries. """
-    if isinstance(l, dict): 
-        for value in l.values():
-            yield from flatten(value)
-    elif isinstance(l, list):
-        for value in l:
-            yield from flatten(value)
-    else:
-        yield l
+    """ Iterates through d.values(), including through lists and sub-dictionaries. Uses an explicit stack rather than recursion, keeping the original order. """
+    stack = [l]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(reversed(item.values()))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+        else:
+            yield item
+
+def is_plain(item) -> bool:
+    """ Returns True if item holds no nested containers or classes, so can be stored as is. """
+    return item is None or isinstance(item, (bool, int, float, str, np.ndarray, np.generic))
 
 def recursive_unpack_class(instance: object) -> dict:
     """
@@ -31,6 +37,8 @@ def recursive_unpack_class(instance: object) -> dict:
         dict: A dictionary containing the unpacked variables.
     """
     def unpack_class(instance):
+        # Slotted dataclasses have no __dict__, so read their fields instead
+        if is_dataclass(instance): return {f.name: handle(getattr(instance, f.name)) for f in fields(instance)}
         unpacked = {}
         for key, value in {**instance.__class__.__dict__, **vars(instance)}.items():
             if  ((key.startswith('__')) or  # no private variables
@@ -41,19 +49,21 @@ def recursive_unpack_class(instance: object) -> dict:
         return unpacked
     
     def unpack_iterable(iterable):
+        if all(is_plain(element) for element in iterable): return list(iterable)  # shallow copy, so the result never aliases the caller's list
         result = []
         for element in iterable:
             result.append(handle(element))
         return result
     
     def unpack_dict(dictionary):
+        if all(is_plain(value) for value in dictionary.values()): return dict(dictionary)
         result = {}
         for key, value in dictionary.items():
             result[key] = handle(value)
         return result
     
     def handle(item):
-        if hasattr(item, '__dict__'):
+        if hasattr(item, '__dict__') or (is_dataclass(item) and not isinstance(item, type)):
             return unpack_class(item)
         elif isinstance(item, (list, tuple)):
             return unpack_iterable(item)    
@@ -79,6 +89,10 @@ def dict_pack(data: Union[dict, list, tuple], first: bool = True) -> Union[dict,
     if is_dataclass(data):
         return asdict(data)
     
+    # Shallow copy lists and dicts of plain values rather than recursing, so the result never aliases live state.
+    elif isinstance(data, list) and all(is_plain(item) for item in data): return list(data)
+    elif isinstance(data, dict) and all(is_plain(value) for value in data.values()): return dict(data)
+
     # Handle dicts by recursing for each value in dict.
     elif isinstance(data, dict):
         data = {key: dict_pack(value, first=False) for key, value in data.items()}
@@ -94,32 +108,56 @@ def dict_pack(data: Union[dict, list, tuple], first: bool = True) -> Union[dict,
     # Return data once it has been processed
     return data
 
+def shallow_asdict(obj):
+    """ Equivalent to dataclasses.asdict(), but leaves non-container values uncopied. Used when data is serialised straight away, so asdict()'s deepcopy is wasted. """
+    if is_dataclass(obj):
+        return {name: shallow_asdict(getattr(obj, name)) for name in obj.__dataclass_fields__}
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(shallow_asdict(item) for item in obj)
+    elif isinstance(obj, dict):
+        return {key: shallow_asdict(value) for key, value in obj.items()}
+    return obj
+
 def dict_unpack(obj, data: dict, first=True) -> object:
     if is_dataclass(obj):
-        obj.__dict__.update(data)
+        for key, value in data.items(): setattr(obj, key, value)  # setattr, as slotted dataclasses have no __dict__
+    # Containers are updated inplace, so modules that imported them keep seeing the restored values
     elif isinstance(obj, dict):
-        obj = {key: dict_unpack(obj[key], data[key], first=False) for key in obj.keys()}
+        for key in obj.keys(): obj[key] = dict_unpack(obj[key], data[key], first=False)
     elif isinstance(obj, list):
-        obj = [dict_unpack(obj_item, data_item) for obj_item, data_item in zip(obj, data)]
+        for idx, (obj_item, data_item) in enumerate(zip(obj, data)): obj[idx] = dict_unpack(obj_item, data_item)
     else:
         if first == True: raise TypeError('Obj must be list, dict or dataclass!')
     return obj
 
 
 def json_compatibalise(obj):
-    """ Converts hierarchical format into a format that can be turned into a json file. """
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, dict):
-        return {key: json_compatibalise(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [json_compatibalise(item) for item in obj]
-    else:
-        return obj
+    """ Converts hierarchical format into a format that can be turned into a json file. Dicts and lists are copied, not modified.
+    Uses an explicit stack of (container, key) pairs to fill, rather than recursion.
+    """
+    root = [obj]
+    stack = [(root, 0)]
+    while stack:
+        container, key = stack.pop()
+        item = container[key]
+        if isinstance(item, np.ndarray):
+            container[key] = item.tolist()
+        elif isinstance(item, dict):
+            container[key] = item = dict(item)
+            stack.extend((item, item_key) for item_key in item)
+        elif isinstance(item, list):
+            container[key] = item = list(item)
+            stack.extend((item, idx) for idx in range(len(item)))
+    return root[0]
+
+def json_default(obj):
+    """ Fallback for json.dump(), converting numpy and typed arrays as they are reached rather than copying the whole tree first. """
+    if isinstance(obj, (np.ndarray, np.generic, array)): return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
     
 def write_file(data, filepath: str):
     file_format = filepath.split('.')[-1]
-    legal_formats = ['json', 'csv', 'pkl', 'psydat', 'yaml']
+    legal_formats = ['json', 'csv', 'pkl', 'psydat', 'yaml', 'parquet']
     if file_format not in legal_formats:
         raise ValueError(f"Invalid format. Must be {', '.join(legal_formats[:-1])} or {legal_formats[-1]}")
 
@@ -133,12 +171,19 @@ def write_file(data, filepath: str):
 
     elif file_format == 'json':
         with open(filepath, 'w') as file:
-            json.dump(data, file, indent=2)
+            json.dump(data, file, indent=2, default=json_default)
 
     elif file_format == 'yaml':
         with open(filepath, 'w') as file:
             yaml.dump(data, file)
 
+    elif file_format == 'parquet':
+        data.to_parquet(filepath, engine='pyarrow', compression='zstd')  # DataFrames only. requires pyarrow
+
+    # DataFrames are written by pandas directly, avoiding the row by row csv writers
+    elif file_format == 'csv' and hasattr(data, 'to_csv'):
+        data.to_csv(filepath, index=False)
+
     elif file_format == 'csv':
         with open(filepath, 'w', newline='') as f:
             # Use dictwriter if list of dicts
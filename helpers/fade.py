@@ -3,7 +3,21 @@ Can handle individual and sequential fades, though sequential fades are currentl
 """
 
 from collections import deque
-from . import Text, Stim
+from . import Text
+
+def updateTxt(txt_stim, increment, stopping_val):
+    """ Fades text by one frame using contrast. Returns True once the fade is finished. """
+    txt_stim.contrast += increment
+    if txt_stim.contrast <= stopping_val: return False
+    txt_stim.contrast = stopping_val
+    return True
+
+def updateStim(stim, increment, stopping_val):
+    """ Fades a stimulus by one frame using opacity. Returns True once the fade is finished. """
+    stim.opacity += increment
+    if stim.opacity < stopping_val: return False
+    stim.opacity = stopping_val
+    return True
 
 class Fade():
     """ Small class to fade text and stimuli in and out. CURRENTLY ONLY ALLOWS ONE RATE OF FADING FOR QUEUE. could modify this to have individual stimuli fade in and out. """
@@ -13,7 +27,7 @@ class Fade():
         framerate (float) : framerate of window; determines fading behaviour
         fade_time (float) : base time to fade in/out for, unless specific in functions
         """
-        self.queue = deque()  # initialise as singly-linked lists
+        self.queue = []  # rebuilt every update, so only unfinished fades are kept
         self.sequential_queue = deque()  # initialise sequential_queue
         self.framerate = framerate
         self.increment = 1/(fade_time*self.framerate)  # amt. to increment fade by each frame
@@ -21,49 +35,36 @@ class Fade():
         # Useful values for handling fadeouts
 
     def append(self, item: object, fade_in: bool=True, reset: bool=True, increment=None, seq:bool=False):
-        if increment is None: increment = self.increment
-        if reset:
-            if isinstance(item, Text): item.contrast = 0 if fade_in else 1
-            else: item.opacity = 0 if fade_in else 1
-        if seq: self.sequential_queue.append((item, increment * (1 if fade_in else -1)))
-        else: self.queue.append((item, increment * (1 if fade_in else -1)))
+        self.extend((item,), fade_in=fade_in, reset=reset, increment=increment, seq=seq)
 
     def extend(self, items: list[object], fade_in:bool=True, reset:bool=True, increment=None, seq:bool=False):
+        # Values shared by all items are resolved once, rather than per item
         if increment is None: increment = self.increment
+        signed_increment = increment * (1 if fade_in else -1)
+        reset_val = 0 if fade_in else 1
+        queue = self.sequential_queue if seq else self.queue
+
         for item in items:
-            self.append(item, fade_in=fade_in, reset=reset, increment=increment, seq=seq)
+            is_text = isinstance(item, Text)
+            if reset:
+                if is_text: item.contrast = reset_val
+                else: item.opacity = reset_val
+            stopping_val = getattr(item, 'original_contrast' if is_text else 'original_opacity', 1)  # looked up once, not every frame
+            queue.append((item, signed_increment, updateTxt if is_text else updateStim, stopping_val))  # choose update function once
     
-    def update(self):
-        """ Updates the opacity of all stimuli in queue and out_queue by one frame.
+    def update(self) -> bool:
+        """ Updates the opacity of all stimuli in queue and out_queue by one frame. Returns True if anything was faded this frame.
         > Notably, there is a bug with TextStim() which means you cannot change their opacity after they have been set. Current workaround changes their contrast instead, but this means they will still block out things behind them. 
         """
-        def updateTxt(txt_stim, increment):
-            txt_stim.contrast += increment
-            stopping_val = txt_stim.original_contrast if hasattr(txt_stim, 'original_contrast') else 1
-            if txt_stim.contrast <= stopping_val: return False
-            txt_stim.contrast = stopping_val
-            return True
-        
-        def updateStim(stim, increment):
-            stim.opacity += increment
-            stopping_val = stim.original_opacity if hasattr(stim, 'original_opacity') else 1
-            if stim.opacity < stopping_val: return False
-            stim.opacity == stopping_val
-            return True
+        is_fading = bool(self.queue or self.sequential_queue)
 
-        # Update normal queue
-        idx = 0
-        while len(self.queue) > idx:
-            value, increment = self.queue[idx]
-            updateItem = updateTxt if isinstance(value, Text) else updateStim
-            if updateItem(value, increment):
-                del self.queue[idx]
-            else:
-                idx += 1
+        # Update normal queue in one pass, keeping unfinished items rather than deleting from the middle
+        self.queue = [(value, increment, updateItem, stopping_val) for value, increment, updateItem, stopping_val in self.queue
+                      if not updateItem(value, increment, stopping_val)]
 
         # Update sequential queue
         if self.sequential_queue:
-            value, increment = self.sequential_queue[0]
-            updateItem = updateTxt if isinstance(value, Text) else updateStim
-            if updateItem(value, increment):
+            value, increment, updateItem, stopping_val = self.sequential_queue[0]
+            if updateItem(value, increment, stopping_val):
                 self.sequential_queue.popleft()
+        return is_fading
@@ -0,0 +1,34 @@
+""" File for FileWriter() class, which runs file writes on a background thread so disk access doesn't delay the next trial's first frame. 
+Writes are run one at a time, in the order they were submitted.
+"""
+
+import queue
+import threading
+import traceback
+
+class FileWriter():
+    """ Small class to queue file writes and run them on a daemon thread. Call join() before quitting to make sure everything is saved. """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def work(self):
+        """ Runs queued writes in order for as long as the experiment is running. Errors are printed rather than killing the thread. """
+        while True:
+            func, args = self.queue.get()
+            try: func(*args)
+            except Exception: traceback.print_exc()
+            finally: self.queue.task_done()
+
+    def submit(self, func, *args):
+        """ Queues func(*args) to run on the writer thread. 
+        func (callable) : function that writes to disk
+        args : arguments to call func with. these should not be modified after submitting
+        """
+        self.queue.put((func, args))
+
+    def join(self):
+        """ Blocks until all submitted writes have finished. """
+        self.queue.join()
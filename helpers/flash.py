@@ -4,14 +4,26 @@ Uses modified Gaussian distribution for nice flat-top flash.
 
 import numpy as np
 from numpy import array as arr
-from scipy.stats import norm
 
 class Flash():
     """ Small class to handle the flashing of stimuli to identify them as targets. """
 
-    def __init__(self, total_time, flashes_ps, frames_ps, flash_colour=arr([1,-0.5,-0.5])):
+    def __init__(self, total_time, flashes_ps, frames_ps, flash_colour=arr([1,-0.5,-0.5], dtype=np.float32)):
         self.distribution, self.n_frames = self.calcFlashDistribution(total_time, flashes_ps, frames_ps)
-        self.flash_colour = flash_colour
+        self.flash_colour = np.asarray(flash_colour, dtype=np.float32)
+        self.register([])
+
+    def register(self, stim_list):
+        """ Stores the base fill and line colours of stim_list as [n, 3] arrays, so flashes are calculated for all stimuli at once. 
+            stim_list (list[Stim]) : list of stimuli to flash. re-registered automatically when flashStim() is given different stimuli.
+        """
+        self.stims = list(stim_list)  # copied, so inplace changes to the caller's list are detected
+        self.base_fills = arr([stim.base_colour for stim in stim_list], dtype=np.float32).reshape(-1, 3)  # float32 to match the distribution
+        self.base_lines = arr([stim.base_line_colour for stim in stim_list], dtype=np.float32).reshape(-1, 3)
+
+        # Differences to the default flash colour, which don't change between frames
+        self.fill_differences = self.flash_colour - self.base_fills
+        self.line_differences = self.flash_colour - self.base_lines
         
     def calcFlashDistribution(self, total_time, flashes_ps, frames_ps):
         """ Returns the distribution of colour that occurs when target stimuli 'flash' at the start of each trial. Uses a 'flatter top' Gaussian distribution. 
@@ -21,16 +33,17 @@ class Flash():
             RETURNS distribution, frames_per_flash
         """
         # Initialise variables
-        if total_time <=0: return [0], 1  # return 'empty' distribution if no flash time
+        if total_time <=0: return np.zeros(1, dtype=np.float32), 1  # return 'empty' distribution if no flash time
         total_flashes = np.ceil(flashes_ps*total_time).astype(int)  # integer so we end on original colour, round up to have at least 1 flash. 
         flash_length = total_time/total_flashes  # Length of one flash in seconds
         frames_per_flash = int(frames_ps * flash_length)  # N. of frames per flash
 
         # Create Gaussian distribution
-        x = np.linspace(-3, 3, frames_per_flash)  # One x-value per frame
-        distribution = sum([norm.pdf(x, mean, 1) for mean in range(-1,2)])  # Sum three Gaussians with means -1, 0, 1
+        # Gaussians are left unnormalised, as the constant cancels out when rescaling
+        x = np.linspace(-3, 3, frames_per_flash, dtype=np.float32)  # One x-value per frame
+        distribution = sum(np.exp(-0.5*(x-mean)**2) for mean in range(-1,2))  # Sum three Gaussians with means -1, 0, 1
         distribution = (distribution-distribution[0]) / distribution[int(len(distribution)/2)]  # Set min- and max- values to 0 and 1 respectively.
-        return distribution, frames_per_flash
+        return np.ascontiguousarray(distribution, dtype=np.float32), frames_per_flash
 
     def flashStim(self, stim_list, frames_passed, flash_colour=None, flash_line=True):
         """ Changes colours of a list of target stimuli given a value (typically taken from a distribution)
@@ -39,22 +52,26 @@ class Flash():
             flash_colour (np.array | None) : [R, G, B] colour with values in range [-1, 1]. defaults to class parameter.
             flash_line (bool) : if True, vary stim lineColor as well as fillColor. defaults to False.
         """
-        if flash_colour is None: flash_colour = self.flash_colour
-        value = self.distribution[frames_passed%self.n_frames]  # Set value using distribution
+        if len(stim_list) != len(self.stims) or any(stim is not registered for stim, registered in zip(stim_list, self.stims)): self.register(stim_list)
+        frame_idx = frames_passed%self.n_frames
+        value = self.distribution[frame_idx]  # Set value using distribution
 
-        for stim in stim_list:
-            base_fill = stim.base_colour  # Take base colour from stimulus object
-            base_line = stim.base_line_colour
+        # Use the precomputed colour differences unless a different flash colour is given
+        if flash_colour is None: fill_differences, line_differences = self.fill_differences, self.line_differences
+        else: fill_differences, line_differences = flash_colour-self.base_fills, flash_colour-self.base_lines
 
-            fill_difference = flash_colour-base_fill
-            stim.fillColor = base_fill + fill_difference*value
+        # Calculate colours for all stimuli at once, then assign them
+        fills = self.base_fills + fill_differences*value
+        for stim, fill in zip(stim_list, fills): stim.fillColor = fill
 
-            if flash_line:
-                line_difference = flash_colour-base_line
-                stim.lineColor = base_line + line_difference*value
-        return frames_passed%self.n_frames
+        if flash_line:
+            lines = self.base_lines + line_differences*value
+            for stim, line in zip(stim_list, lines): stim.lineColor = line
+        return frame_idx
 
-    def plot(self):
-        """ Plot distribution. """
-        from matplotlib.pyplot import plot as plt
-        plt(self.distribution)  # Not sure if this will work without x-values? 
+    def plot(self, ax=None):
+        """ Plot distribution against frame number.
+            ax (matplotlib.axes.Axes | None) : axes to plot on. defaults to the current pyplot axes.
+        """
+        import matplotlib.pyplot as plt  # imported here as only needed for debugging. later imports are cached by python
+        (ax or plt).plot(np.arange(len(self.distribution)), self.distribution)
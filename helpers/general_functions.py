@@ -1,14 +1,10 @@
-from numpy.random import randint
+import numpy as np
 
-def rand_seed() -> int:
-    """ Function to calculate a random numpy seed."""
-    return randint(0, 2**31-1)
+def rand_seed(rng: np.random.Generator, size: int=None):
+    """ Function to calculate a random numpy seed from generator `rng`, or an array of `size` seeds in a single draw. """
+    seeds = rng.integers(0, 2**31-1, size=size)
+    return int(seeds) if size is None else seeds
 
 def record_framedrops(win, framerate):
     win.recordFrameIntervals = True
-    win.refreshThreshold = 1/framerate + 0.004
-
-class Neut:
-    """ Class which returns True to both True and False. """
-    def __bool__(self):
-        return True
\ No newline at end of file
+    win.refreshThreshold = 1/framerate + 0.004
\ No newline at end of file
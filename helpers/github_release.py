@@ -1,13 +1,34 @@
+import os
+import json
 import requests
 
-def get_latest_release(owner, repo):
+owner = 'bitesizing'
+repo = 'mot-task'
+cache_path = os.path.expanduser('~/.cache/mot-task/release.json')
+
+def get_latest_release(owner=owner, repo=repo, timeout: float=2):
+    """ Returns the latest release json, or None if unavailable. Call when needed rather than at import, as it may access the network.
+    The response is cached to disk with its ETag, so later calls only download the release if it has changed (304 otherwise).
+    """
+    cached = None
+    if os.path.exists(cache_path):
+        with open(cache_path) as file:
+            cached = json.load(file)
+    headers = {'If-None-Match': cached['etag']} if cached and cached.get('etag') else {}
+
     url = f'https://api.github.com/repos/{owner}/{repo}/releases/latest'
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        return cached['release'] if cached else None  # offline, so fall back to the cached release
+
+    if response.status_code == 304:
+        return cached['release']
+    elif response.status_code == 200:
+        release = response.json()
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as file:
+            json.dump({'etag': response.headers.get('ETag'), 'release': release}, file)
+        return release
     else:
         return None
-    
-owner = 'bitesizing'
-repo = 'mot-task'
-latest_release = get_latest_release(owner, repo)
\ No newline at end of file
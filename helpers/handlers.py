@@ -1,61 +1,12 @@
 """ File for ExpHandler() subclass of Psychopy data.ExperimentHandler() class, primarily to remove uneeded values. """
 import os
-import pickle
-from dataclasses import dataclass, field, fields, asdict, is_dataclass
+import re
+from dataclasses import dataclass, field
 
-from psychopy import data
+from . import TrialData, write_file, shallow_asdict, LoopInfo
 
-from . import TrialData, write_file, LoopInfo
-
-class MetaHandler(type):
-    """ 
-    Metaclass to dynamically create variables named after a string and add default variables to each class. 
-    Defines custom metaclass methods for iteration, getting items by index, and the next method for iteration. 
-    """
-
-    def __new__(cls, name, bases, dct, items, this_item, n_items):
-        # Dynamically create a variable named after a string
-        setattr(cls, items, items)
-        setattr(cls, this_item, this_item)
-        setattr(cls, n_items, n_items)
-
-        # Add variables by default to each class
-        if items not in dct: dct[items] = []
-        if this_item not in dct: dct[this_item] = -1
-        @property
-        def _n_items(self): return len(getattr(self, items))
-        dct[n_items] = _n_items
-        
-        # Define custom metaclass methods
-        # dct['__repr__'] = cls.custom_repr
-
-        def custom_iter(self):
-            """ Custom iterator. """
-            # ALLOWS ITERATOR TO RESTART ON SAME VALUE IT QUIT ON.
-            tmp_item = getattr(self, this_item)
-            if tmp_item != -1:
-                setattr(self, this_item, tmp_item-1)
-            return self
-        dct['__iter__'] = custom_iter  # add method to class
-
-        def custom_next(self):
-            """ Custom next method. """
-            setattr(self, this_item, getattr(self, this_item) + 1)  # increment this_item
-            if getattr(self, this_item) >= getattr(self, n_items): 
-                setattr(self, this_item, -1)  # reset value
-                raise StopIteration
-            return getattr(self, items)[getattr(self, this_item)]
-        dct['__next__'] = custom_next  # add method to class
-
-        def custom_getitem(self, idx): return getattr(self, items)[idx]
-        dct['__getitem__'] = custom_getitem
-            
-        # Create the class using the modified dictionary
-        return super().__new__(cls, name, bases, dct)
-
-# Example class using the custom metaclass    
 @dataclass
-class ExpHandler(metaclass=MetaHandler, items='loops', n_items='n_loops', this_item='this_loop'):
+class ExpHandler():
     """ Class to hold routines in the experiment. 
 
         Attributes:
@@ -76,6 +27,19 @@ class ExpHandler(metaclass=MetaHandler, items='loops', n_items='n_loops', this_i
     this_loop: int = -1
     extra_info: dict = field(default_factory=dict)
 
+    @property
+    def n_loops(self) -> int: return len(self.loops)
+
+    def __len__(self): return len(self.loops)
+
+    def __getitem__(self, idx): return self.loops[idx]
+
+    def __iter__(self):
+        """ Iterates through loops, storing the current index in this_loop. Resumes from this_loop if it was saved mid-experiment. """
+        for self.this_loop in range(max(self.this_loop, 0), len(self.loops)):
+            yield self.loops[self.this_loop]
+        self.this_loop = -1  # reset once finished
+
     def add_loop(self, loop_handler: 'LoopHandler'):
         """ Add a loop_handler to the exp_handler's loops. """
         self.loops.append(loop_handler)
@@ -86,18 +50,22 @@ class ExpHandler(metaclass=MetaHandler, items='loops', n_items='n_loops', this_i
 
     def save_file(self):
         """ General function to save a file """
-        data = asdict(self)
+        data = shallow_asdict(self)  # pickled straight away, so values don't need deepcopying
         filepath = f'{self.data_filepath}.psydat'
 
         if os.path.exists(filepath):
+            # Scan the folder once for existing suffixed copies, rather than checking each filename in turn
             prefix, _, suffix = filepath.rpartition('.')
+            folder, basename = os.path.split(prefix)
+            pattern = re.compile(rf'{re.escape(basename)}_(\d+)\.{re.escape(suffix)}')
+            existing = {int(match.group(1)) for filename in os.listdir(folder or '.') if (match := pattern.fullmatch(filename))}
             mod = 1
-            while os.path.exists(f'{prefix}_{mod}.{suffix}'): mod += 1
+            while mod in existing: mod += 1
             filepath = f'{prefix}_{mod}.{suffix}'
         write_file(data, filepath)
 
 @dataclass
-class LoopHandler(metaclass=MetaHandler, items='trials', n_items='n_trials', this_item='this_trial'):
+class LoopHandler():
     """ Class to hold trials for each loop of the experiment.
 
         Attributes:
@@ -111,4 +79,17 @@ class LoopHandler(metaclass=MetaHandler, items='trials', n_items='n_trials', thi
     loop_info: LoopInfo = None
     trials: list['TrialData'] = field(default_factory=list)
     this_trial: int = -1
-    # exp_handler: 'ExpHandler' = None
\ No newline at end of file
+    # exp_handler: 'ExpHandler' = None
+
+    @property
+    def n_trials(self) -> int: return len(self.trials)
+
+    def __len__(self): return len(self.trials)
+
+    def __getitem__(self, idx): return self.trials[idx]
+
+    def __iter__(self):
+        """ Iterates through trials, storing the current index in this_trial. Resumes from this_trial if it was saved mid-loop. """
+        for self.this_trial in range(max(self.this_trial, 0), len(self.trials)):
+            yield self.trials[self.this_trial]
+        self.this_trial = -1  # reset once finished
\ No newline at end of file
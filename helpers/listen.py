@@ -2,13 +2,11 @@
 Helpful in avoiding bugs where e.g. holding the mouse down is counted as a click every frame. Ensures clicks are 'true' clicks. 
 """
 
-from collections import defaultdict
-
 class Listen():
     """ Listens for a True input following a False input. Useful in storing information about mouse buttons. """
 
     def __init__(self):
-        self.has_been_false = defaultdict(lambda: False)
+        self.has_been_false: dict[str, bool] = {}  # ids missing from the dict have not been False yet
 
     def __repr__(self):
         return f"Listener for {list(self.has_been_false.keys())}"
@@ -18,8 +16,8 @@ class Listen():
         is_true (bool) : whether the input is currently True
         id (str) : identifier for specific input. defaults to "", but this can only be used once, unless self.reset is called
         """
-        if self.has_been_false[id] and is_true: return True
-        if not self.has_been_false[id] and not is_true: self.has_been_false[id] = True
+        if is_true: return self.has_been_false.get(id, False)
+        self.has_been_false[id] = True
         return False
     
     def reset(self, id:(str|list[str])="", reset_all=False):
@@ -27,7 +25,7 @@ class Listen():
         id (str|list[str]) : identifies a specific input or set of inputs
         reset_all (bool) : resets all values in dict. defaults to False
         """
-        if reset_all: self.has_been_false = defaultdict(lambda:False)
+        if reset_all: self.has_been_false = {}
         elif isinstance(id, list):
             for string in id:
                 self.reset(id=string)
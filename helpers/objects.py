@@ -3,7 +3,7 @@
 from psychopy.visual.shape import ShapeStim
 from psychopy.visual import TextStim
 import numpy as np
-from numpy import array as arr, minimum, maximum
+from numpy import array as arr
 
 class Stim(ShapeStim):
     """ Custom class inheriting from ShapeStim, to allow for additional variables. """
@@ -41,12 +41,15 @@ class Stim(ShapeStim):
         self.bounce = True
 
         self.vel = vel
-        self.bb = None  # Set on update
 
     # Update the position of a stimulus.
     def update(self, t=1):
         self.t = t
-        self.bb = self.createBb(self.r, self.pos, self.vel*t)
+
+    @property
+    def bb(self):
+        """ Bounding box of the stimulus' remaining movement this frame. Built on access, as movement uses inline bounds instead. """
+        return self.createBb(self.r, self.pos, self.vel*self.t)
 
     def updateSize(self, size):
         self.size = size
@@ -60,29 +63,32 @@ class Stim(ShapeStim):
         RETURNS tuple(centre, dimensions) : bb centre and WxH
         """
 
-        # Calculate two opposite corners of the bounding box.
-        vel = np.asarray(vel)
-        corner = pos - np.sign(vel)*r
-        opposite_corner = pos + vel + np.sign(vel)*r
-        dimensions = abs(opposite_corner-corner)  # WxH
-        centre = minimum(corner, opposite_corner) + dimensions*0.5
-        return BoundingBox(dimensions, centre, win=self.win)
+        # Calculate two opposite corners of the bounding box. Vectors are 2d, so use scalar maths rather than numpy calls on tiny arrays
+        (x, y), (vx, vy) = pos, vel
+        sx = r if vx > 0 else -r if vx < 0 else 0  # sign of velocity, scaled by r
+        sy = r if vy > 0 else -r if vy < 0 else 0
+        x0, y0 = x-sx, y-sy
+        x1, y1 = x+vx+sx, y+vy+sy
+        width, height = abs(x1-x0), abs(y1-y0)
+        return BoundingBox((width, height), (min(x0, x1) + width*0.5, min(y0, y1) + height*0.5), win=self.win)
 
 
 class BoundingBox(object):
     """ A custom bounding box object to store boundary information. Forms the basis of Partition. """
+    __slots__ = ('dimensions', 'centre', 'width', 'height', 'win', 'min_x', 'min_y', 'max_x', 'max_y', 'min_pos', 'max_pos', 'stim')
 
     def __init__(self, dimensions, centre, win=None, draw=False):
-        self.dimensions = np.asarray(dimensions)
-        self.centre = np.asarray(centre)
-        self.width, self.height = self.dimensions
+        self.dimensions = arr(dimensions, dtype=float)  # copied, so later changes to the passed arrays don't move the box
+        self.centre = arr(centre, dtype=float)
+        self.width, self.height = width, height = self.dimensions.tolist()
         self.win = win
 
-        # Assign min- and max- coordinates
-        self.min_x = self.centre[0] - self.width/2
-        self.min_y = self.centre[1] - self.height/2
-        self.max_x = self.centre[0] + self.width/2
-        self.max_y = self.centre[1] + self.height/2
+        # Assign min- and max- coordinates as python floats, which are faster than numpy scalars in per-frame bounce checks
+        centre_x, centre_y = self.centre.tolist()
+        self.min_x = centre_x - width/2
+        self.min_y = centre_y - height/2
+        self.max_x = centre_x + width/2
+        self.max_y = centre_y + height/2
         self.min_pos = arr([self.min_x, self.min_y])
         self.max_pos = arr([self.max_x, self.max_y])
 
@@ -129,7 +135,6 @@ class Partitions(BoundingBox):
         """
 
         super().__init__(dimensions, centre, win, draw=child)  # init bounding box
-        self.index = 0  # allows iteration through __iter__ and __next__ functions
         self.id = id
         self.child = child
         self.stim_list = []
@@ -148,53 +153,40 @@ class Partitions(BoundingBox):
     
     def __getitem__(self, idx):
         """ Returns what happens when accessed with square brackets. """
-        idx = arr(idx)  # convert to np. array
         if self.child: raise TypeError("'Child' partition is not subscriptable")
-        if not np.all((0<=idx) & (idx<self.children.shape)): raise IndexError("Index out of range")
-        return self.children[tuple(idx)]  # convert back or code will treat it as slice
+        column, row = idx  # bounds checked as python ints, as numpy would wrap negative indices
+        if not (0 <= column < self.columns and 0 <= row < self.rows): raise IndexError("Index out of range")
+        return self.children[column, row]
     
     def __iter__(self):
-        self.index = 0
-        return self
-
-    def __next__(self):
-        """ Iterates through the children of a parent class. """
+        """ Iterates through the children of a parent class, in (column, row) order. Holds no state, so iterations can be nested. """
         if self.child: raise TypeError("'Child' partition cannot be iterated through.")
-        if self.index < self.n:
-            result = self[int(self.index/self.columns), self.index%self.rows]
-            self.index += 1
-            return result
-        else:
-            raise StopIteration
+        return iter(self.children.flat)
 
     def draw(self):
         if self.child: self.stim.draw()
-        else: [child.stim.draw() for row in self.children for child in row]
+        else:
+            for child in self.children.flat: child.stim.draw()
     
     def setAutoDraw(self, auto_draw):
         if self.child: self.stim.setAutoDraw(auto_draw)
-        else: [child.stim.setAutoDraw(auto_draw) for child in self.children]
+        else:
+            for child in self.children.flat: child.stim.setAutoDraw(auto_draw)
 
     def genPartitionChildren(self, split, outer_dimensions, centre, spacing, win=None):
         """ Internal function to generate children for Partitions object. 
             RETURNS 2d array of child MyPartition objects with specified dimensions.
         """
 
-        # Find the bottom left partition centre to begin from.
+        # Find the bottom left partition centre, then step by one partition plus spacing in each axis
         inner_dimensions = (outer_dimensions - (split-1)*spacing) / split
-        partition_centre = centre - 0.5*outer_dimensions + 0.5*inner_dimensions
-        original_y = partition_centre[1]
-        partitions=np.ndarray(tuple(split), dtype=Partitions)  # numpy array of Boundary objects. 
-
-        # Iterate through to generate partitions
-        for column in range(split[0]):
-            partition_centre[1] = original_y
-            for row in range(split[1]):
-                partitions[column, row] = Partitions(
-                    inner_dimensions, partition_centre,
-                    win=win, child=True, id=(column, row))
-                partition_centre[1] += inner_dimensions[1] + spacing[1]  # Increment centre of partition in y-axis
-            partition_centre[0] += inner_dimensions[0] + spacing[0]  # Increment centre of partition in x-axis
+        first_centre = centre - 0.5*outer_dimensions + 0.5*inner_dimensions
+        xs = first_centre[0] + np.arange(split[0])*(inner_dimensions[0] + spacing[0])
+        ys = first_centre[1] + np.arange(split[1])*(inner_dimensions[1] + spacing[1])
+
+        partitions = np.empty(tuple(split), dtype=object)  # numpy array of Partitions objects
+        for column, row in np.ndindex(*partitions.shape):
+            partitions[column, row] = Partitions(inner_dimensions, (xs[column], ys[row]), win=win, child=True, id=(column, row))
         return partitions
 
 
@@ -1,5 +1,5 @@
 """ File to handle display setting presets for each device.
-Add your own under name given by `os.environ['COMPUTERNAME']`
+Add your own under name given by `os.environ['COMPUTERNAME']`. Devices without COMPUTERNAME set use no preset.
 """
 
 device_presets = {
@@ -1,5 +1,6 @@
 """ File for dataclass definitions, which are used to store variables defined in constants.py that are later used in the experiment. """
 import os
+import re
 import numpy as np
 from numpy import asarray as arr
 from dataclasses import dataclass, field, fields, MISSING
@@ -9,7 +10,9 @@ from psychopy import data
 
 from . import device_presets
 
-@dataclass
+default_device_name = os.environ.get('COMPUTERNAME', '')  # COMPUTERNAME is only set on Windows. '' matches no preset, so default settings apply. resolved once on import
+
+@dataclass(slots=True)
 class TestingParameters():
     """ Class defining parameters related to testing and debugging.
 
@@ -51,28 +54,37 @@ class TestingParameters():
     all_same_condition: bool
     skip_all_tracked_flash: bool
 
-@dataclass
+@dataclass(slots=True)
 class LoopInfo():
     """ Class defining parameters specific to each experimental routine.
 
     Attributes:
-        condition_probabilities (list[float]): List of probabilities for each condition.
-        n_trials_per_block (int): Number of trials per block.
+        condition_counts (list[int]): Number of trials of each condition in every block.
         n_blocks (int): Number of blocks.
         n_tracked (int): Number of items tracked.
+        n_trials_per_block (int): Number of trials per block, calculated as sum(condition_counts).
+        condition_probabilities (list[float]): Proportion of trials of each condition, for reporting only.
     """
     loop_n: int
-    condition_probabilities: list[float]
-    n_trials_per_block: int
+    condition_counts: list[int]
     n_blocks: int
     n_tracked: int
 
+    # Calculated in __post_init__. Declared as fields so they have slots
+    n_trials_per_block: int = field(init=False)
+    condition_probabilities: list[float] = field(init=False)
+    n_trials_in_routine: int = field(init=False)
+    overlap_per_block: list[float] = field(init=False)
+    tickets_per_block: list[int] = field(init=False)
+
     def __post_init__(self):
+        self.n_trials_per_block: int = sum(self.condition_counts)
+        self.condition_probabilities: list[float] = [count/self.n_trials_per_block for count in self.condition_counts]
         self.n_trials_in_routine: int = self.n_blocks * self.n_trials_per_block
         self.overlap_per_block: list[float] = []
         self.tickets_per_block: list[int] = [0]*self.n_blocks
 
-@dataclass
+@dataclass(slots=True)
 class ExperimentalInfo():
     """ Class defining general parameters about the participant and experiment.
 
@@ -94,7 +106,7 @@ class ExperimentalInfo():
 
     psychopy_version: str = psychopy.__version__
     email: str = ""
-    date: str = data.getDateStr()
+    date: str = field(default_factory=data.getDateStr)  # evaluated on instantiation, not on import
     exp_start_time: str = ""
     exp_end_time: str = ""
 
@@ -105,8 +117,14 @@ class ExperimentalInfo():
     starting_seed: int = None
     def update(self, restart_from_last: bool):
         """ Function to set the participant number to the highest number not present in the data folder."""
+        # Scan the data folder once rather than checking for each participant file in turn
+        pattern = re.compile(rf'{re.escape(self.exp_name)}_pp(\d+)\.psydat')
+        existing = set()
+        if os.path.isdir(self.save_folder_name):
+            existing = {int(match.group(1)) for filename in os.listdir(self.save_folder_name) if (match := pattern.fullmatch(filename))}
+
         pp_n = self.starting_pp_n
-        while os.path.isfile(f'{self.save_folder_name}/{self.exp_name}_pp{pp_n}.psydat'):
+        while pp_n in existing:
             pp_n += 1
         if restart_from_last: pp_n -= 1
 
@@ -115,7 +133,7 @@ class ExperimentalInfo():
         self.eye_data_filepath = self.filepath + "_eye_data.csv"
         self.pp_n = self.starting_seed = pp_n
 
-@dataclass
+@dataclass(slots=True)
 class WindowInfo():
     """ Class defining parameters related to experiment window. 
 
@@ -125,6 +143,7 @@ class WindowInfo():
         partition_split (np.ndarray): The partition split coordinates.
         spacing (np.ndarray): The spacing between elements on the display.
         fixation_radius (float): The radius of the fixation point.
+        fixation_radius_sq (float): fixation_radius squared, for distance checks without a square root.
 
         device_name (str): The name of the device.
         screen_size (list[int]): The size of the screen.
@@ -138,18 +157,23 @@ class WindowInfo():
     fixation_radius: float
 
     # Initialise default preset values
-    device_name: str = os.environ['COMPUTERNAME']
+    device_name: str = default_device_name
     screen_size: list[int] = field(default_factory=lambda: [1920, 1080])
     framerate: int = 60
     screen_n: int = 0
 
+    # Calculated in __post_init__
+    screen_ratio: float = field(init=False)
+    fixation_radius_sq: float = field(init=False)
+
     def __post_init__(self):
         # Assign presets from utils/device_presets.py (only works on init)
-        if self.device_name in device_presets:
-            for key, value in device_presets[self.device_name].items(): setattr(self, key, value)
-        self.screen_ratio = self.screen_size[0]/self.screen_size[1]  # set ratio
+        for key, value in device_presets.get(self.device_name, {}).items(): setattr(self, key, value)
+        width, height = self.screen_size
+        self.screen_ratio: float = width/height  # set ratio
+        self.fixation_radius_sq = self.fixation_radius**2
 
-@dataclass
+@dataclass(slots=True)
 class TimingInfo():
     """ Class defining parameters related to trial timing.
 
@@ -182,7 +206,7 @@ class TimingInfo():
     max_nan_time: int
     max_gazebreak_time: float
 
-@dataclass
+@dataclass(slots=True)
 class StimulusInfo:
     """ Class defining parameters related to trial stimuli.
 
@@ -196,6 +220,7 @@ class StimulusInfo:
     n: int
     speed: float
     r: float
+    d: float = field(init=False)
 
     def __post_init__(self):
         self.d: float = self.r * 2
@@ -212,12 +237,12 @@ class TrialData:
     block_n: int
     loop_n: int
     seed: int
-    trial_cond: str
+    trial_cond: int
 
-    is_complete: str = False
+    is_complete: bool = False
 
     # Timing
-    move_times: arr = None
+    move_times: list[float] = None
     g_start_trial: float = None
     g_end_trial: float = None
     t_start_moving: float = None
@@ -231,7 +256,7 @@ class TrialData:
     total_response_time: float = None
     
     # Response identifiers
-    tracked_ids: list[int] = field(default_factory = lambda: [])
+    tracked_ids: list[int] = field(default_factory=list)
     queried_id: int = None
     event_id: int = None
     response_pos: float = None
@@ -241,27 +266,27 @@ class TrialData:
     response_overlap: float = None
     n_tickets: int = 0
 
-    stim_info: list = None
-    """ Structure of stim_info:
-    [{ 'bounces': [{
-            'time': None,
-            'vel': None,
-            'pos': None
-        }],
-        'starting_vel': None,
-        'starting_pos': None }] """
+    # Per-stimulus info, indexed by stim id
+    starting_vel: np.ndarray = None
+    """ [n_stim, 2] array of starting velocities """
+    starting_pos: np.ndarray = None
+    """ [n_stim, 2] array of starting positions """
+    bounces: list = None
+    """ One array('d', [time, vel_x, vel_y, pos_x, pos_y, ...]) per stimulus, with 5 values per bounce, in order """
 
     def __setattr__(self, name, value):
-        """ Override setattr class for custom message if illegal value is added. """
-        if name not in self.__slots__:
-            raise AttributeError(f"'{name}' must be added as an attribute in the TrialData class before you can assign to it!")
-        object.__setattr__(self, name, value)
+        """ Override setattr class for custom message if illegal value is added. Slots already reject unknown names, so no membership check is needed. """
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            raise AttributeError(f"'{name}' must be added as an attribute in the TrialData class before you can assign to it!") from None
 
     def reset_optional(self, new_seed: int):
         """ Reset optional variables of the class. """
-        for field in fields(self):
-            if field.default is not MISSING:
-                setattr(self, field.name, field.default)
-            elif field.default_factory is not MISSING:
-                setattr(self, field.name, field.default_factory())
+        for name, default_factory in optional_trial_fields:
+            object.__setattr__(self, name, default_factory())  # names are known fields, so skip the __setattr__ check
         self.seed = new_seed
+
+# Field names and default factories of TrialData's optional values, built once rather than on every reset
+optional_trial_fields: list[tuple] = [(f.name, f.default_factory) if f.default_factory is not MISSING else (f.name, lambda default=f.default: default)
+                                      for f in fields(TrialData) if f.default is not MISSING or f.default_factory is not MISSING]
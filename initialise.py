@@ -4,17 +4,18 @@ Callables can therefore be imported from this file without needing to access the
 """
 
 import os
-import tobii_research as tr
+import numpy as np
 from numpy import asarray as arr
-from numpy.random import choice as randchoice, seed
 
-from psychopy import logging, visual, core, event, gui
+from psychopy import logging, visual, core, event
 import psychopy.iohub as io
 from psychopy.hardware import keyboard
 from psychopy.tools.filetools import fromFile
 
-from helpers import Flash, Fade, Listen, LoopHandler, ExpHandler, Stim, Text, Partitions, ExpHandler, TrialData, LoopInfo, dict_unpack, rand_seed, write_file
+from helpers import Flash, Fade, Listen, FileWriter, LoopHandler, ExpHandler, Stim, Text, Partitions, TrialData, LoopInfo, dict_unpack, rand_seed, write_file
 from constants import p, e, w, t, l, s, trial_keys, name_dict
+if p.use_eyetracker: import tobii_research as tr  # only import eyetracker sdk if it is used
+if p.show_gui: from psychopy import gui  # only initialise Qt if the starting dialogue is shown
 
 class Components():
     """ All stimuli objects used within the experiment. """
@@ -29,35 +30,28 @@ class Components():
         self.timeout_txt = Text(win, "Maximum response time reached.\n\n\nClick to continue.", color="white", height=0.05)
         self.great_response_txt = Text(win, "+1 ticket!", color="white", height=0.03)
         self.amazing_response_txt = Text(win, "+2 tickets!", color="white", height=0.03)
-        self.distance_txt = [Text(win, f"{i}% overlap", pos=(0, 0), height=0.03) for i in range(101)]
+        self.distance_txt = Text(win, "0% overlap", pos=(0, 0), height=0.03)  # one stim, with text set per trial
 
 
 """ ---------- FUNCTIONS IN ORDER OF RUNTIME ---------- """
-def genStartingGui() -> gui.Dlg:
-    """Generate a starting box to gather emails at the start of the experiment.
-
-    Returns:
-        gui.Dlg: The dialogue box for gathering emails
+def genStartingGui() -> None:
+    """Show a starting box to gather emails at the start of the experiment, or the participant number to restart from.
+    Assigns the entered values to e (and p.run_lottery) in place.
     """
-    # Generate different dialogue boxes depending on if set to restart from last position
-    if p.restart_from_last:
-        dlg = gui.Dlg(title='Restart from file...')
-        dlg.addField('Participant number: ', e.pp_n, required=True, enabled=p.restart_from_last)
-        ok_data = dlg.show()
-
-        # Parse
-        if dlg.OK == False: core.quit()
-        e.pp_n = ok_data[0]
-    else:
-        dlg = gui.Dlg(title='Please enter your data!')
-        dlg.addField('Participant number: ', e.pp_n, required=True, enabled=p.restart_from_last)
+    # Participant number is only editable when restarting; email is only asked for on a new run
+    dlg = gui.Dlg(title='Restart from file...' if p.restart_from_last else 'Please enter your data!')
+    dlg.addField('Participant number: ', e.pp_n, required=True, enabled=p.restart_from_last)
+    if not p.restart_from_last:
         dlg.addText('\nPlease leave the email field blank if you do NOT want to take part in the random lottery.', isFieldLabel=False)
         dlg.addField(label='Email: ', required=False)
-        ok_data = dlg.show()
+    ok_data = dlg.show()
 
-        # Parse
-        if dlg.OK == False: core.quit()
-        _, e.email = ok_data
+    # Parse
+    if dlg.OK == False: core.quit()
+    if p.restart_from_last:
+        e.pp_n = ok_data[0]
+    else:
+        e.email = ok_data[1]
         if e.email == "": p.run_lottery = False
 
 def importDataOnRestart(filepath) -> ExpHandler:
@@ -83,10 +77,10 @@ def importDataOnRestart(filepath) -> ExpHandler:
         loops.append(LoopHandler(**loop, trials=trials))
     exp_handler = ExpHandler(**handler_dict, loops=loops)  # automatically reassign all remaining values
 
-    # Unpack settings from the extra_info in the file
+    # Unpack settings from the extra_info in the file. Settings are updated inplace, as other modules already hold references to them
+    module_globals = globals()
     for key, value in extra_info.items():
-        obj = globals()[name_dict[key]]
-        obj = dict_unpack(obj, value)
+        dict_unpack(module_globals[name_dict[key]], value)
     return exp_handler
 
 def setupExpHandler() -> ExpHandler:
@@ -98,35 +92,30 @@ def setupExpHandler() -> ExpHandler:
     def setupTrialData(l: LoopInfo) -> list['TrialData']:
         """ Function to generate a list of TrialData objects for each trial in the loop. """
         # Initialise variables
-        cond_probs, n_trials_per_block, n_blocks = arr(l.condition_probabilities), l.n_trials_per_block, l.n_blocks
-        n_conds = len(cond_probs)
-        cond_trial_nums = (n_trials_per_block*cond_probs).astype(int)
-
-        # Check legal number of trials per condition
-        if p.all_same_condition is False and sum(cond_trial_nums) != n_trials_per_block:
-            raise ValueError("n_trials_per_block must divide into conditions!")
-        
+        cond_trial_nums, n_trials_per_block, n_blocks = arr(l.condition_counts), l.n_trials_per_block, l.n_blocks
+        n_conds = len(cond_trial_nums)
+
         loop_data = []
+        seeds = rand_seed(rng, size=n_blocks*n_trials_per_block).tolist()  # draw every trial seed at once, as python ints
         for block in range(n_blocks):
             trial_start = block*n_trials_per_block
-            block_trial_nums = cond_trial_nums.copy()  # 'remaining' numbers of each trial type
-
-            for i in range(n_trials_per_block):
-                # If we are using 'experimental' distribution of conditions
-                if p.all_same_condition:
-                    trial_cond = p.all_same_condition
-                else:
-                    trial_cond = randchoice(n_conds, p=block_trial_nums/sum(block_trial_nums))
-                    block_trial_nums[trial_cond]-=1
-
-                # Append TrialData object to loop_data
-                loop_data.append(TrialData(
-                    trial_n=trial_start+i,
-                    trial_n_in_block=i,
-                    block_n=block,
-                    loop_n=l.loop_n,
-                    trial_cond=trial_cond,
-                    seed=rand_seed()))
+
+            # Shuffle the exact number of trials of each condition into a random order for this block
+            if p.all_same_condition:
+                block_conds = [p.all_same_condition]*n_trials_per_block
+            else:
+                block_conds = np.repeat(np.arange(n_conds), cond_trial_nums)
+                rng.shuffle(block_conds)
+                block_conds = block_conds.tolist()  # convert once, rather than per trial
+
+            # Append TrialData objects to loop_data
+            loop_data.extend(TrialData(
+                trial_n=trial_start+i,
+                trial_n_in_block=i,
+                block_n=block,
+                loop_n=l.loop_n,
+                trial_cond=trial_cond,
+                seed=seeds[trial_start+i]) for i, trial_cond in enumerate(block_conds))
         return loop_data
 
     loops = [LoopHandler(trials=setupTrialData(loop_info), loop_info=loop_info) for loop_info in l]
@@ -185,7 +174,7 @@ def setupEyetracker():
 
 
 # Objects for experiment - want to be accessed from multiple files.
-seed(e.starting_seed)  # Set numpy seed
+rng = np.random.default_rng(e.starting_seed)  # experiment-level generator, seeded by participant
 if p.use_eyetracker and p.save_eyetracker_data: write_file("", e.eye_data_filepath)  # create eyetracker save file
 if p.show_gui: genStartingGui()
 
@@ -203,4 +192,5 @@ keypad = keyboard.Keyboard(backend='iohub')
 # Custom classes
 flash = Flash(t.flash_time, t.flashes_per_second, w.framerate)
 fade = Fade(w.framerate, t.fade_time)
-listen = Listen()
\ No newline at end of file
+listen = Listen()
+file_writer = FileWriter()
\ No newline at end of file
@@ -3,8 +3,6 @@ File used to run the experiment.
 Quite a simple file consisting mainly just of the run_all function containing the experimental loop. 
 """
 import os
-from numpy import array as arr
-from dataclasses import asdict
 
 from psychopy import prefs, plugins, core, data, logging
 plugins.activatePlugins()
@@ -12,7 +10,7 @@ prefs.hardware['audioLib'] = 'ptb'
 prefs.hardware['audioLatencyMode'] = '3'
 
 from helpers import rand_seed, record_framedrops, TrialData
-from initialise import e, p, w, t, l, exp_handler, logfile, io_server, win
+from initialise import e, p, w, t, l, rng, exp_handler, logfile, io_server, win
 from setup import ExpController, Trial
 
 
@@ -42,7 +40,7 @@ def run_all(exp_controller: ExpController):
             # Until trial is complete
             trial_response = 'continue'
             while trial_response != 'complete':
-                trial = Trial(exp_handler=exp_handler, exp_controller=exp_controller)  # initialise trial class
+                trial = Trial(loop_handler=loop_handler, trial_data=trial_data, exp_controller=exp_controller)  # initialise trial class
 
                 # For each iteration (reset) of a trial
                 while trial_response == 'continue':
@@ -52,14 +50,14 @@ def run_all(exp_controller: ExpController):
                 if trial_response == 'reset':
                     trial_response = 'continue'  # reset trial response
                     exp_controller.show_gaze()  # show 'broken fixation' screen
-                    trial_data.reset_optional(new_seed=rand_seed())  # reset optional values in data (which are set during trial)
+                    trial_data.reset_optional(new_seed=rand_seed(rng))  # reset optional values in data (which are set during trial)
             
             # Handle trial end
             trial_data.g_end_trial = global_clock.getTime()
 
-            # Check if any values are still None
-            for key, value in asdict(trial_data).items():
-                if value is None:
+            # Check if any values are still None. Only top level values are checked, so no asdict() copy is needed
+            for key in trial_data.__dataclass_fields__:
+                if getattr(trial_data, key) is None:
                     print(f'{key} is None')
 
             # Handle breaks
@@ -1,9 +1,9 @@
 """ Module of callables specific to the experiment. These callables DO rely on _all_vars and so have to be packaged separately. """
 
 from .start_data import calc_start_data
-from .move_stimuli import moveStimuli
+from .move_stimuli import makeMoveStimuli
 
 from .controllers import ExpController
 from .trial import Trial
 
-__all__ = ['calc_start_data', 'moveStimuli', 'ExpController', 'Trial']
\ No newline at end of file
+__all__ = ['calc_start_data', 'makeMoveStimuli', 'ExpController', 'Trial']
\ No newline at end of file
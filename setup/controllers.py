@@ -3,28 +3,56 @@
     - Gaze breaks away from central fixation
     - Pausing and quitting the experiment.
 """
-from dataclasses import asdict
-import tobii_research as tr
-
 from psychopy import core, logging, data
 
 from helpers import flatten, Text, dict_pack, TrialData
 from constants import response_keys, p, e, w, t, s, trial_keys, l, name_dict
-from initialise import exp_handler, win, eyetracker, mouse, keypad, listen, fade
+if p.use_eyetracker: import tobii_research as tr
+if p.record_framedrops: import matplotlib.pyplot as plt  # import at start rather than on quit
+
+from initialise import exp_handler, win, eyetracker, mouse, keypad, listen, fade, file_writer
+
+settings = {key: globals()[value] for key, value in name_dict.items()}  # settings objects saved as extra_info on quit
+polled_keys = list(response_keys.values())  # built once rather than every poll
 
 class ExpController():
     """ Class to control experimental pausing and stopping. Differs from inbuilt ExperimentHandler because it does not store data, and has access to win. """
 
     def __init__(self, break_time):
         self.break_time = break_time
+        self.can_idle = win.winType == 'pyglet'  # events can only be pumped without flipping on pyglet windows. other backends keep flipping static screens
+        self.trial_clocks = tuple(core.Clock() for _ in range(5))  # trial, routine, movement, nan and gazebreak clocks, reset by each trial rather than recreated
+
+        # Break and gaze screen text is created once; only the strings change between showings
+        self.block_txt = Text(win, "You have completed the block!", pos=(0, 0.35))
+        self.overlap_txt = Text(win, "", pos=(0, 0.25))
+        self.tickets_txt = Text(win, "", pos=(0, 0.18))
+        self.rest_txt = Text(win, "Feel free to take a short break. The next block will begin shortly.", pos=(0, 0.05))
+        self.continue_txt = Text(win, "", pos=(0, -0.2))
+        self.gaze_txt = Text(win, "Please remain fixated on the central cross.\nClick to continue.", height=0.05, pos=(0, 0.15))
+
+    def poll_keys(self) -> set[str]:
+        """ Polls the keypad once for all response keys. getKeys() is destructive, so every key must be checked from the same poll.
+            RETURNS set[str] : names of the response keys pressed since the last poll
+        """
+        return {key.name for key in keypad.getKeys(keyList=polled_keys)}
     
     def listen_inputs(self, timers:list[core.Clock]=[], drawn_stim:list=[]) -> bool:
         """ Parent function to listen for 'pause' and 'quit' keys and perform appropriate function. Returns true to continue the current trial or section.
             listen_continue (bool) : listens for a 'continue' key to change to the next trial
         """
-        if keypad.getKeys(keyList=[response_keys['pause_key']]): self.pause(timers=timers, drawn_stim=drawn_stim)
-        if keypad.getKeys(keyList=[response_keys['quit_key']]): self.quit()
-        return True if keypad.getKeys(keyList=[response_keys['continue_key']]) else False
+        keys = self.poll_keys()
+        if response_keys['pause_key'] in keys: self.pause(timers=timers, drawn_stim=drawn_stim)
+        if response_keys['quit_key'] in keys: self.quit()
+        return response_keys['continue_key'] in keys
+
+    def idle(self):
+        """ Waits briefly instead of flipping while a static screen is shown, so inputs are polled faster than the refresh rate. 
+        Only used on passive screens outside of trial timing, and only on pyglet windows (see can_idle). core.wait() only dispatches window events while hogging the CPU, 
+        so events are pumped explicitly to keep mouse presses registering and the window responsive.
+        """
+        core.wait(0.001, hogCPUperiod=0)
+        win.winHandle.dispatch_events()
 
     def pause(self, timers:list[core.Clock]=[], drawn_stim:list=[]):
         """ Pause this experiment, preventing the flow from advancing to the next routine until resumed.
@@ -32,14 +60,21 @@ class ExpController():
             drawn_stim (dict) : dictionary of stimuli to keep drawing during the pause. defaults to empty. 
         """
         timer_pause_times = [timer.getTime() for timer in timers]  # Store pausetimes
+        flat_stims = list(flatten(drawn_stim))  # flatten once, drawn objects don't change while paused
+        is_drawn = False  # the paused screen is static, so only needs flipping once
         while True:
             # Check for pause or quit keys
-            if keypad.getKeys(keyList=[response_keys['quit_key']]): self.quit()
-            if keypad.getKeys(keyList=[response_keys['pause_key']]): break
+            keys = self.poll_keys()
+            if response_keys['quit_key'] in keys: self.quit()
+            if response_keys['pause_key'] in keys: break
+            if is_drawn and self.can_idle:
+                self.idle()
+                continue
 
             # Draw current objects
-            [stim.draw() for stim in flatten(drawn_stim)]
+            for stim in flat_stims: stim.draw()
             win.flip()  # flip the screen
+            is_drawn = True
         
         # Reset timer values
         for timer, pause_time in zip(timers, timer_pause_times):
@@ -55,63 +90,59 @@ class ExpController():
         mouse.setVisible(True)
         break_timer = core.Clock()
         block_n, loop_n, loop_info = trial_data.block_n, trial_data.loop_n, l[trial_data.loop_n]
-        is_final_block, is_final_loop = (block_n == loop_info.n_blocks-1), (loop_n == len(l)-1), loop_info.tickets_per_block[block_n]
+        is_final_block, is_final_loop = (block_n == loop_info.n_blocks-1), (loop_n == len(l)-1)
         n_tickets, p_overlap = loop_info.tickets_per_block[block_n], int(loop_info.overlap_per_block[block_n])
 
-        text_options = [[
-            {'text': "You have completed the block!",
-             'pos': (0, 0.35)},
-            {'text': f"You responded with {p_overlap}% average overlap",
-             'pos': (0, 0.25)},
-            {'text': f"and earned {n_tickets} ticket{'s' if n_tickets!=1 else ''}.",
-             'pos': (0, 0.18),
-             'include': p.run_lottery},
-            {'text': "Feel free to take a short break. The next block will begin shortly.",
-             'pos': (0, 0.05), 
-             'include': not is_final_block},
-        ], [
-            # Continue text options
-            {'text': f"You have now completed the experiment :)\nYou may click to close this page.", 
-             'pos': (0, -0.2), 
-             'include': is_final_block and is_final_loop},
-            {'text': "You have finished the first experiment.\nPlease let the investigator know\nbefore continuing.", 
-             'pos': (0, -0.2), 
-             'include': is_final_block and not is_final_loop},
-            {'text': f"You may now click to\nbegin the next block.",
-             'pos': (0, -0.2), 
-             'include': not is_final_block}     
-        ]]
-        text = [Text(**option) for option in text_options[0] if option.pop('include')]
-        continue_text = [Text(**option) for option in text_options[1] if option.pop('include')]
+        # Update cached text for this block
+        self.overlap_txt.text = f"You responded with {p_overlap}% average overlap"
+        self.tickets_txt.text = f"and earned {n_tickets} ticket{'s' if n_tickets!=1 else ''}."
+        if not is_final_block: self.continue_txt.text = "You may now click to\nbegin the next block."
+        elif is_final_loop: self.continue_txt.text = "You have now completed the experiment :)\nYou may click to close this page."
+        else: self.continue_txt.text = "You have finished the first experiment.\nPlease let the investigator know\nbefore continuing."
+
+        text = [self.block_txt, self.overlap_txt]
+        if p.run_lottery: text.append(self.tickets_txt)
+        if not is_final_block: text.append(self.rest_txt)
+        continue_text = [self.continue_txt]
         fade.extend(text, increment=1/(0.3*w.framerate), seq=True)  # append to spawn sequentially
         listen.reset('continue_break')
+        can_continue = False  # set once the break has elapsed, after which the break timer is no longer checked
+        is_drawn = False  # True while the screen is unchanged since the last flip
 
         # Main loop to draw text and listen for end break
         while True:
-            if keypad.getKeys(keyList=[response_keys['quit_key']]): self.quit()
+            if response_keys['quit_key'] in self.poll_keys(): self.quit()
 
-            if is_final_block or win.getFutureFlipTime(clock=break_timer) >= t.break_time:
-                if continue_text not in text:
-                    text.extend(continue_text)
-                    fade.append(continue_text, seq=is_final_block)
+            # Flips may be skipped, so use the timer directly rather than the predicted flip time
+            if not can_continue and (is_final_block or break_timer.getTime() >= t.break_time):
+                can_continue = True
+                is_drawn = False
+                text.extend(continue_text)
+                fade.extend(continue_text, seq=is_final_block)
 
-                # Draw text and listen for end break
-                if listen.listen(mouse.getPressed()[0], 'continue_break'): break
+            # Listen for end break
+            if can_continue and listen.listen(mouse.getPressed()[0], 'continue_break'): break
 
-            [option.draw() for option in text]
-            fade.update()
+            if is_drawn and self.can_idle:
+                self.idle()
+                continue
+            for option in text: option.draw()
+            is_drawn = not fade.update()
             win.flip()
     
     def show_gaze(self):
         mouse.setVisible(True)
         listen.reset('continue_gaze')
-        gaze_txt = Text(win=win, text=f"Please remain fixated on the central cross.\nClick to continue.", height=0.05, pos=(0,0.15))
-        fade.append(gaze_txt)
+        fade.append(self.gaze_txt)
+        is_drawn = False  # True while the screen is unchanged since the last flip
 
         while not listen.listen(mouse.getPressed()[0], 'continue_gaze'):
-            if keypad.getKeys(keyList=[response_keys['quit_key']]): self.quit()
-            gaze_txt.draw()
-            fade.update()
+            if response_keys['quit_key'] in self.poll_keys(): self.quit()
+            if is_drawn and self.can_idle:
+                self.idle()
+                continue
+            self.gaze_txt.draw()
+            is_drawn = not fade.update()
             win.flip()
     
     def quit(self):
@@ -122,12 +153,12 @@ class ExpController():
 
         # Add extra_info to handler and save data.
         e.exp_end_time = data.getDateStr(format='%Y-%m-%d %Hh%M.%S.%f %z', fractionalSecondDigits=6)
-        exp_handler.extra_info = {key: dict_pack(globals()[value]) for key, value in name_dict.items()}
+        file_writer.join()  # finish any queued writes before saving
+        exp_handler.extra_info = {key: dict_pack(value) for key, value in settings.items()}
         exp_handler.close()
         win.close()
 
         if p.record_framedrops:
-            import matplotlib.pyplot as plt
             plt.plot(win.frameIntervals)
             plt.show()
         core.quit()
\ No newline at end of file
@@ -4,87 +4,118 @@
     - Calculates random starting velocities of stimuli
     - Keeps track of tracked stimuli, queried stimuli, and event stimuli for each trial. 
 """
+from array import array
+
 import numpy as np
 from numpy import array as arr, sin, cos, pi
-from numpy.random import uniform, choice as randchoice, shuffle
 
 from helpers import Partitions, Stim, TrialData
-from initialise import e, s, t, trial_keys
+from initialise import s, t, trial_keys
 
 class Grid():
-    def __init__(self, dimensions, n_cells, rad_arr):
+    """ Coarse grid of spawn cells within a partition, with cells sized relative to the stimulus radius. 
+    Placing a stimulus removes every cell within 2r of it, so stimuli never overlap. 
+    """
+    def __init__(self, dimensions, r: float, rng: np.random.Generator, cells_per_r: int=4):
+        """
+        dimensions (arr[2,1]) : width and height of the partition, in `height` units
+        r (float) : radius of the stimuli
+        rng (np.random.Generator) : generator used to choose cells and positions within them
+        cells_per_r (int) : grid resolution. higher values let stimuli spawn closer to partition edges, at the cost of more cells
+        """
         # Initialise starting grid
+        self.rng = rng
         self.dimensions: arr = dimensions
-        self.cell_dimensions: arr = (dimensions*n_cells).astype(int)
-        self.starting_grid: arr = np.zeros(self.cell_dimensions, dtype=bool)
+        self.cell_size: float = r/cells_per_r
+        self.block_rad: int = 2*cells_per_r  # cells either side of a stimulus that another stimulus can't spawn in
 
-        # Find lower left and upper right grid corners
-        self.min_x, self.min_y = self.convertToGridCell(             rad_arr)
-        self.max_x, self.max_y = self.convertToGridCell(dimensions - rad_arr)
+        # Find lower left and upper right (exclusive) legal cells, which lie entirely at least r from the edges
+        self.min_x = self.min_y = cells_per_r
+        self.max_x, self.max_y = self.convertToGridCell(dimensions - r)
 
-        # Set inner grid values to True
-        self.starting_grid[self.min_x+1:self.max_x, self.min_y+1:self.max_y] = True
+        # Store the (x, y) coordinates of every legal cell. No full grid is needed as only the legal rectangle is ever used
+        xs, ys = np.mgrid[self.min_x:self.max_x, self.min_y:self.max_y]
+        self.starting_free: arr = np.column_stack((xs.ravel(), ys.ravel())).astype(np.int32)
+        self.scratch: arr = np.empty_like(self.starting_free)  # reused for cell distances on every update
     
     def reset_grid(self):
-        """ Reset the grid to the starting state. """
-        self.grid = np.copy(self.starting_grid)
+        """ Reset the free cells to the starting state. Free cell arrays are never modified inplace, so no copy is needed. """
+        self.free = self.starting_free
     
     def update_grid(self, partition_min_pos):
-        """ Function to update the grid with a bunch of values. """
-        legal_cells = np.argwhere(self.grid==True)  # array of all legal positions
-        cell_idx = legal_cells[randchoice(len(legal_cells))]  # choose random start cell
-        self.setGridValues(cell_idx, self.min_x)  # add 'illegal' grid values inplace
+        """ Function to choose a random free cell, then remove all cells too close to it from the free cells. """
+        cell_idx = self.free[self.rng.integers(len(self.free))]  # choose random start cell
+        self.setGridValues(cell_idx, self.block_rad)  # remove 'illegal' cells
         return self.convertToHeightUnits(cell_idx, partition_min_pos)
     
-    def setGridValues(self, centre_cell, grid_rad_arr):
-        """ Assigns a square 'block' of values in a 2d numpy array in the grid to 0. """
-        min_x, min_y = np.maximum((0,0),            centre_cell - grid_rad_arr*2 - 1)
-        max_x, max_y = np.minimum(self.grid.shape,  centre_cell + grid_rad_arr*2 + 1)
-        self.grid[min_x:max_x, min_y:max_y] = 0
+    def setGridValues(self, centre_cell, block_rad):
+        """ Removes a square 'block' of cells around centre_cell from the free cells. """
+        dist = self.scratch[:len(self.free)]
+        np.subtract(self.free, centre_cell, out=dist)
+        np.abs(dist, out=dist)
+        self.free = self.free[(dist > block_rad).any(axis=1)]  # keep cells outside the block in either axis
 
     def convertToGridCell(self, pos) -> arr:
         """ Converts 'height' unit information to 'grid cell' units. """
-        result = pos * self.cell_dimensions
+        result = pos / self.cell_size
         return result.astype(int)
 
     def convertToHeightUnits(self, cell_coordinates, min_pos) -> arr:
-        """ Converts 'grid cell' information to 'height' units. """
-        result = (cell_coordinates / self.cell_dimensions) + min_pos
-        cell_size_in_height = self.dimensions / self.cell_dimensions
-        return uniform(result, result + cell_size_in_height)
+        """ Converts 'grid cell' information to 'height' units, at a random position within the cell. """
+        result = cell_coordinates*self.cell_size + min_pos
+        return self.rng.uniform(result, result + self.cell_size)
+
+
+grids: dict[tuple, Grid] = {}  # grids built so far, keyed by partition dimensions and stimulus radius
+
+def get_grid(dimensions, r: float, rng: np.random.Generator) -> Grid:
+    """ Returns the Grid for a partition size and stimulus radius, building it only the first time. Grid cells are identical for every trial, so only the generator changes.
+        rng (np.random.Generator) : generator of the current trial
+    """
+    key = (tuple(dimensions), r)
+    if key not in grids: grids[key] = Grid(dimensions=dimensions, r=r, rng=rng)
+    cell_grid = grids[key]
+    cell_grid.rng = rng
+    return cell_grid
 
 
-def calc_start_data(partitions:Partitions, stims:list[Stim], n_tracked: int, trial_data:TrialData):
+def calc_tracker_per_partition(split, n_tracked: int, rng: np.random.Generator) -> arr:
+    """ Calculates the number of tracked stimuli per partition using alternating rows and columns where possible. No partition may have 2 more tracked stim than another.
+        split (arr[1,2]) : n_columns and n_rows of partitions.
+        rng (np.random.Generator) : generator used to break ties between equally legal partitions
+    """
+    # Use python ints for such a small grid, updating row and column sums as stimuli are assigned
+    n_columns, n_rows = split
+    tracked = [[0]*n_rows for _ in range(n_columns)]
+    col_sum, row_sum = [0]*n_columns, [0]*n_rows
+    for _ in range(n_tracked):
+        global_min = min(min(column) for column in tracked)
+        min_col_sum, min_row_sum = min(col_sum), min(row_sum)
+        legal_idxs = [(col_idx, row_idx) for col_idx in range(n_columns) if col_sum[col_idx] == min_col_sum
+                      for row_idx in range(n_rows) if row_sum[row_idx] == min_row_sum and tracked[col_idx][row_idx] == global_min]
+        col_idx, row_idx = legal_idxs[rng.integers(len(legal_idxs))]
+        tracked[col_idx][row_idx] += 1
+        col_sum[col_idx] += 1
+        row_sum[row_idx] += 1
+    return arr(tracked)
+
+
+def calc_start_data(partitions:Partitions, stims:list[Stim], n_tracked: int, trial_data:TrialData, rng: np.random.Generator):
     """ Generates random starting velocities and (non-overlapping) starting positions for a list of stimuli and a given partition set.
         partitions (Partitions) : object containing information about window partitions.
         stims (list[Stim]) : list of stimuli to assign info to.
         trial_data (dict) : dict of data to record and pass to trialHandler
+        rng (np.random.Generator) : generator for all random draws, seeded per trial
     """
-    def random_velocity(speed) -> arr:
-        """ Returns an [x, y] velocity vector with a random direction, scaled by speed """
-        theta = uniform(high=2*pi)
-        random_unit_vector = arr([sin(theta), cos(theta)])
-        return random_unit_vector * speed
-
-    def calc_tracker_per_partition(split, n_tracked) -> arr:
-        """ Calculates the number of tracked stimuli per partition using alternating rows and columns where possible. No partition may have 2 more tracked stim than another.
-            split (arr[1,2]) : n_columns and n_rows of partitions.
-        """
-        tracked = np.zeros(split)
-        for _ in range(n_tracked):
-            legal_idxs = []
-            global_min = np.min(tracked)
-            row_sum = np.sum(tracked, 0)
-            row_idxs = np.where(row_sum == np.min(row_sum))[0]
-            col_sum = np.sum(tracked, 1)
-            col_idxs = np.where(col_sum == np.min(col_sum))[0]
-            legal_idxs.extend((col_idx, row_idx) for col_idx in col_idxs for row_idx in row_idxs if tracked[col_idx, row_idx] == global_min)
-            tracked[legal_idxs[randchoice(len(legal_idxs))]] += 1
-        return tracked
-    
+    def random_velocities(speed, n) -> arr:
+        """ Returns an [n, 2] array of [x, y] velocity vectors with random directions, scaled by speed """
+        thetas = rng.uniform(high=2*pi, size=n)
+        return np.column_stack((sin(thetas), cos(thetas))) * speed
+
     def calc_partition_data(cell_grid: Grid, partition: Partitions, start_idx: int, n_stim: int, n_tracked: int):
         """ Calculate all start data for a given partition. """
         cell_grid.reset_grid()  # reset grid to starting state
+        velocities = random_velocities(s.speed_per_frame, n_stim)
 
         partition.stim_list = []
         for i in range(n_stim):
@@ -98,26 +129,28 @@ def calc_start_data(partitions:Partitions, stims:list[Stim], n_tracked: int, tri
             partition.stim_list.append(stim)  # append stimuli to partition id 
 
             # Assign random velocity and random (non-overlapping) starting position
-            stim.vel = random_velocity(s.speed_per_frame)
+            stim.vel = velocities[i]
             stim.pos = cell_grid.update_grid(partition.min_pos)
             stim.is_tracked = True if i < n_tracked else False
             stim.update()  # create stim bounding box, etc. 
 
             # Pass information to trial data
             if (i < n_tracked): trial_data.tracked_ids.append(stim.id)
-            trial_data.stim_info.append({'bounces': [], 'starting_vel': stim.vel, 'starting_pos': stim.pos})
+            trial_data.starting_vel[stim.id] = stim.vel  # assigning into the arrays copies, as stim values change inplace
+            trial_data.starting_pos[stim.id] = stim.pos
 
     # Initialise variables
     n_stim = len(stims)
-    cell_grid = Grid(dimensions=partitions.inner_dimensions, n_cells=1000, rad_arr=arr([stims[0].r, stims[0].r]))
+    cell_grid = get_grid(partitions.inner_dimensions, stims[0].r, rng)
 
     # Reset trial_data values that you asign to (in case of reset)
     trial_data.tracked_ids = []
-    trial_data.stim_info = []
+    trial_data.starting_vel, trial_data.starting_pos = np.empty((n_stim, 2)), np.empty((n_stim, 2))  # filled by stim id
+    trial_data.bounces = [array('d') for _ in range(n_stim)]
 
     # Assign tracked stimuli to partitions such that each col. or row must be filled before being given another tracked stim. 
     p_n_stim: int = int(n_stim/partitions.n)
-    n_tracked_per_partition: arr = calc_tracker_per_partition(partitions.split, n_tracked)
+    n_tracked_per_partition: arr = calc_tracker_per_partition(partitions.split, n_tracked, rng)
 
     # Iterate through partitions and calculate starting params for each stimulus
     start_idx = 0
@@ -129,22 +162,24 @@ def calc_start_data(partitions:Partitions, stims:list[Stim], n_tracked: int, tri
     
     # Assign queried, tracked and move time to trial data
     shuffle_tracked = trial_data.tracked_ids.copy()
-    shuffle(shuffle_tracked)
+    rng.shuffle(shuffle_tracked)
     trial_data.queried_id = shuffle_tracked.pop()  # assign queried id to trial data
 
     cond: str = trial_keys[trial_data.trial_cond]
     if cond in ("CROSSED", "CHANGED"):
         # Pop from shuffle_tracked if possible. 
         if shuffle_tracked:  trial_data.event_id = shuffle_tracked.pop()
-        # Else take from other stimuli
-        else: trial_data.event_id = randchoice([i for i in range(n_stim) if i != trial_data.queried_id])
+        # Else take from other stimuli, drawing from n_stim-1 ids and skipping over the queried id
+        else:
+            event_id = int(rng.integers(n_stim-1))
+            trial_data.event_id = event_id + (event_id >= trial_data.queried_id)
 
         trial_length = t.trial_length
         if cond == "CROSSED":
             trial_length[1] = t.max_cross_time
-            trial_data.move_times = [uniform(*trial_length), uniform(*t.post_cross_length)]
+            trial_data.move_times = [rng.uniform(*trial_length), rng.uniform(*t.post_cross_length)]
         elif cond == "CHANGED":
             trial_length[1] = t.max_change_time
-            trial_data.move_times = [uniform(*trial_length), uniform(*t.post_change_length)]
+            trial_data.move_times = [rng.uniform(*trial_length), rng.uniform(*t.post_change_length)]
     else:
-        trial_data.move_times = [uniform(*t.trial_length)]
\ No newline at end of file
+        trial_data.move_times = [rng.uniform(*t.trial_length)]
\ No newline at end of file
@@ -6,34 +6,36 @@
     - Runs through each trial subroutine iteratively
 """
 import csv
-import tobii_research as tr
+import math
 import numpy as np
 from numpy import array as arr
-from numpy.random import seed, uniform
-from numpy.linalg import norm as mag
 
-from psychopy import core, logging, visual, event
-from psychopy.visual import TextStim
+from psychopy import core, logging
 
-from helpers import flatten, TrialData, LoopHandler, ExpHandler, LoopInfo
-from . import ExpController, calc_start_data, moveStimuli
+from helpers import flatten, TrialData, LoopHandler, LoopInfo
+from . import ExpController, calc_start_data, makeMoveStimuli
 
-from initialise import p, e, w, t, s, c, l, trial_keys, win, mouse, flash, fade, listen, eyetracker
+from initialise import p, e, w, t, s, c, trial_keys, win, mouse, flash, fade, listen, eyetracker, file_writer
+if p.use_eyetracker: import tobii_research as tr
 
 class Trial():
     """ Class handling an entire trial.
-        trial_data (dict) : dict of trial parameters (e.g. cond, trial_length)
-        routine_data (dict) : data of current routine (e.g. number of tracked stims)
+        loop_handler (LoopHandler) : loop the trial belongs to
+        trial_data (TrialData) : trial parameters (e.g. cond, seed), with results assigned in place
         exp_controller (ExpController) : controller object to handle pausing, quitting, breaks etc.
     """
-    def __init__(self, exp_handler: ExpHandler, exp_controller:ExpController):
+    def __init__(self, loop_handler: LoopHandler, trial_data: TrialData, exp_controller:ExpController):
         self.exp_controller: ExpController = exp_controller
-        self.loop_handler: LoopHandler = exp_handler[exp_handler.this_loop]
+        self.loop_handler: LoopHandler = loop_handler
         self.loop_info: LoopInfo = self.loop_handler.loop_info
-        self.trial_data: TrialData = self.loop_handler[self.loop_handler.this_trial]
+        self.trial_data: TrialData = trial_data
         self.cond: str = trial_keys[self.trial_data.trial_cond]
 
-        seed(self.trial_data.seed)  # assign numpy seed
+        # Longer initial wait on first trial in the block
+        if p.longer_initial_wait and self.trial_data.trial_n_in_block == 0: self.initial_wait_time = max(1, t.wait_time)
+        else: self.initial_wait_time = t.wait_time
+
+        self.rng = np.random.default_rng(self.trial_data.seed)  # trial generator, reproducible from the trial seed
         listen.reset(['response', 'timeout', 'feedback'])  # reset listener bc of old trials
 
         # Eyetracker vars
@@ -43,16 +45,30 @@ class Trial():
             self._eye_pos = None
 
         # Calc starting data by directly assigning to objects. Modifies trial_data values in place.
-        calc_start_data(partitions=c.partitions, stims=c.stims, n_tracked=self.loop_info.n_tracked, trial_data=self.trial_data)
+        calc_start_data(partitions=c.partitions, stims=c.stims, n_tracked=self.loop_info.n_tracked, trial_data=self.trial_data, rng=self.rng)
         self.tracked_stims = [c.stims[id] for id in self.trial_data.tracked_ids]
         self.queried_stim = c.stims[self.trial_data.queried_id]
         if self.cond in ('CROSSED', 'CHANGED'): self.event_stim = c.stims[self.trial_data.event_id]
 
+        # Feedback text positions only depend on the queried partition, so are worked out before the trial starts
+        txt_height = 0.03
+        self.txt_buffer = txt_height * 1.2
+        txt_on_right = 1 if self.queried_stim.partition_id[0] == 1 else -1
+        self.txt_x_pos = (c.partitions.inner_width + c.partitions.spacing[0])/2*txt_on_right
+        self.txt_bottom_y_pos = c.partitions[self.queried_stim.partition_id].max_y + txt_height/2 + (self.txt_buffer-txt_height)
+
+        # Movement functions with this trial's settings bound, for tracking and event routines
+        self.move_stimuli = makeMoveStimuli(trial_data=self.trial_data)
+        self.move_event_stimuli = makeMoveStimuli(cross=(self.cond == 'CROSSED'), change=(self.cond == 'CHANGED'), trial_data=self.trial_data)
+
         # Routine and clock variables
         self.drawn_stim = []
         self.current_routine, self.first_access, self.tracked_n = self.startTrial, True, -1
-        self.trial_timer, self.routine_timer, self.movement_timer, self.nan_timer, self.gazebreak_timer = core.Clock(), core.Clock(), core.Clock(), core.Clock(), core.Clock()
+        for clock in exp_controller.trial_clocks: clock.reset()
+        self.trial_timer, self.routine_timer, self.movement_timer, self.nan_timer, self.gazebreak_timer = exp_controller.trial_clocks
+        self.pause_timers = (self.routine_timer, self.trial_timer)  # timers restored after a pause. clocks are reset, never replaced
         win.callOnFlip(self.routine_timer.reset)  # resets routine clock on first flip... 
+        self.record_frames(False)  # only record frame intervals once stimuli start moving
 
     def update_frame(self) -> bool:
         """ Parent function to call the current subroutine using self.routines. Designed to be called every frame. 
@@ -62,11 +78,13 @@ class Trial():
         response = self.current_routine(self.first_access)
 
         # On end trial OR 'continue' input from exp_controller (return 'complete')
-        if self.exp_controller.listen_inputs(timers=[self.routine_timer, self.trial_timer], drawn_stim=self.drawn_stim) \
+        if self.exp_controller.listen_inputs(timers=self.pause_timers, drawn_stim=self.drawn_stim) \
                 or response == 'complete':
             mouse.setPos((0,0))
+            self.record_frames(False)
             self.trial_data.is_complete = True
-            if p.use_eyetracker and p.save_eyetracker_data: self.append_eyetracker_data_to_csv()
+            logging.flush()  # write log entries queued during the trial
+            if p.use_eyetracker and p.save_eyetracker_data: file_writer.submit(self.append_eyetracker_data_to_csv, list(self.all_gaze_data))
             return 'complete'  # end trial
         
         # On reset trial because fixation broken (return 'reset')
@@ -74,6 +92,8 @@ class Trial():
             print(f"All gaze data: {self.all_gaze_data}")  # print all gaze data
             c.fixation.color='black'
             mouse.setVisible(True)
+            self.record_frames(False)
+            logging.flush()
             return 'reset'
         
         # On continue routine (return None)
@@ -83,14 +103,25 @@ class Trial():
         # On new routine (return routine)
         else:
             self.current_routine, self.first_access = response, True
-            self.routine_timer = core.Clock()  # reset subroutine timer
+            self.routine_timer.reset()  # reset subroutine timer, reusing the same clock
+            logging.flush()  # log entries are queued in memory, so only write them between routines rather than every frame
 
-        [stim.draw() for stim in flatten(self.drawn_stim)]
-        logging.flush()
+        for stim in self.flat_drawn_stim: stim.draw()
         win.flip()  # Flip the screen
         fade.update()
         return 'continue'  # On new OR same routine (return 'continue')
 
+    @property
+    def drawn_stim(self) -> list:
+        """ Stimuli drawn every frame, as a (possibly nested) list. """
+        return self._drawn_stim
+
+    @drawn_stim.setter
+    def drawn_stim(self, drawn_stim: list):
+        """ Stores a flattened copy so drawn stimuli aren't flattened every frame. Must be reassigned, not modified inplace. """
+        self._drawn_stim = drawn_stim
+        self.flat_drawn_stim = tuple(flatten(drawn_stim))
+
     @property
     def mouse_pos(self):
         """ Return the position of the mouse as a numpy array. """
@@ -102,7 +133,8 @@ class Trial():
         if p.skip_response: return True
         fix_pos = self.eye_pos if p.use_eyetracker else self.mouse_pos
         if fix_pos is None: return False
-        if mag(fix_pos)<=w.fixation_radius:
+        x, y = fix_pos
+        if x*x + y*y <= w.fixation_radius_sq:
             self.gazebreak_timer.reset()
         elif self.gazebreak_timer.getTime()>t.max_gazebreak_time:
             return False
@@ -111,8 +143,9 @@ class Trial():
     @property
     def currently_inside_radius(self):
         fix_pos = self.eye_pos if p.use_eyetracker else self.mouse_pos
-        if (fix_pos is None) or mag(fix_pos) > w.fixation_radius: return False
-        return True
+        if fix_pos is None: return False
+        x, y = fix_pos
+        return x*x + y*y <= w.fixation_radius_sq
     
     @property
     def eye_pos(self):
@@ -120,40 +153,45 @@ class Trial():
     
     @eye_pos.setter
     def eye_pos(self, gaze_data):
-        """ Convert raw data into usable height units."""
-        height_pos = np.asarray(gaze_data)
-        height_pos -= 0.5
-        height_pos[0] *= w.screen_ratio
-        self._eye_pos = height_pos
+        """ Convert raw data into usable height units, as an (x, y) tuple."""
+        x, y = gaze_data
+        self._eye_pos = ((x-0.5)*w.screen_ratio, y-0.5)
 
-    def append_eyetracker_data_to_csv(self):
+    def append_eyetracker_data_to_csv(self, all_gaze_data: list[dict]):
+        """ Appends a trial's gaze samples to the eyetracker csv. Run on the file_writer thread. """
+        if not all_gaze_data: return
         with open(e.eye_data_filepath, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.all_gaze_data[0].keys())
+            writer = csv.DictWriter(f, fieldnames=all_gaze_data[0].keys())
             if f.tell() == 0:  # Check if file is empty
                 writer.writeheader()  # Write header if file is empty
-            for sample in self.all_gaze_data:
-                writer.writerow(sample)
+            writer.writerows(all_gaze_data)
 
     def gaze_data_callback(self, gaze_data):
         """ Wrapper function used when querying eyetracker. Only updates if != nan. Tries both eyes. Prioritises left. """
         if self.nan_timer.getTime() > t.max_nan_time: self._eye_pos = None
 
-        self.all_gaze_data.append({'trial_n': self.trial_data.trial_n, 'trial_time': self.trial_timer.getTime(), **gaze_data})
-        left_pos, right_pos = gaze_data['left_gaze_point_on_display_area'], gaze_data['right_gaze_point_on_display_area']
+        if p.save_eyetracker_data: self.all_gaze_data.append({'trial_n': self.trial_data.trial_n, 'trial_time': self.trial_timer.getTime(), **gaze_data})
+        (left_x, left_y), (right_x, right_y) = gaze_data['left_gaze_point_on_display_area'], gaze_data['right_gaze_point_on_display_area']
+        left_nan = left_x != left_x or left_y != left_y  # nan is the only value not equal to itself
+        right_nan = right_x != right_x or right_y != right_y
 
         # If both nan, return
-        if np.isnan(left_pos).any() and np.isnan(right_pos).any(): return
+        if left_nan and right_nan: return
 
         # If one nan, use other
-        elif np.isnan(left_pos).any(): gaze_pos = right_pos
-        elif np.isnan(right_pos).any(): gaze_pos = left_pos
+        elif left_nan: gaze_pos = (right_x, right_y)
+        elif right_nan: gaze_pos = (left_x, left_y)
 
         # Else use average
-        else: gaze_pos = tuple(np.mean(arr([left_pos, right_pos]), axis=0))
+        else: gaze_pos = ((left_x+right_x)/2, (left_y+right_y)/2)
 
         self.eye_pos = gaze_pos
         self.nan_timer.reset()
 
+    def record_frames(self, record: bool):
+        """ Toggles recording of frame intervals when recording framedrops, so only frames where stimuli move are kept. """
+        if p.record_framedrops: win.recordFrameIntervals = record
+
     def time_passed(self, timer: core.Clock) -> float:
         """ Return time at next flip that will have passed for a given timer. """
         return win.getFutureFlipTime(clock=timer)
@@ -176,13 +214,8 @@ class Trial():
         if first_access:
             self.drawn_stim = [c.stims, c.partitions, c.fixation]
 
-        # Handle longer initial wait on first trial in the block.
-        if p.longer_initial_wait and self.trial_data.trial_n_in_block == 0:
-            if self.time_passed(self.routine_timer) >= max(1, t.wait_time):
-                return self.rFlashStimuli
-        else:
-            if self.time_passed(self.routine_timer) >= t.wait_time:
-                return self.rFlashStimuli
+        if self.time_passed(self.routine_timer) >= self.initial_wait_time:
+            return self.rFlashStimuli
             
 
     def rFlashStimuli(self, first_access: bool=False):
@@ -198,10 +231,11 @@ class Trial():
                 return self.rTrackStimuli
 
         # Flash stimuli once per frame
-        flash.flashStim(self.tracked_stims, int(self.time_passed(self.routine_timer)*w.framerate))
+        routine_time = self.time_passed(self.routine_timer)
+        flash.flashStim(self.tracked_stims, int(routine_time*w.framerate))
         
         # Reset flash and continue at end of stimuli
-        if self.time_passed(self.routine_timer) >= t.flash_time:
+        if routine_time >= t.flash_time:
             flash.flashStim(self.tracked_stims, 0)  # reset flashing
             return self.rTrackStimuli
 
@@ -213,16 +247,18 @@ class Trial():
             if self.tracked_n == 0:
                 self.trial_data.t_start_moving = win.getFutureFlipTime(clock=self.trial_timer)
                 self.movement_timer.reset()
+                self.record_frames(True)
             self.drawn_stim = [c.stims, c.partitions, c.fixation]
 
-        moveStimuli(c.partitions, c.stims, trial_data=self.trial_data, time_on_flip=self.time_passed(timer=self.trial_timer))
+        self.move_stimuli(c.partitions, c.stims, time_on_flip=self.time_passed(timer=self.trial_timer))
         if p.move_forever: return  # stim move forever, can be exited with exit_key
         if (self.time_passed(self.routine_timer) >= self.trial_data.move_times[self.tracked_n]):
-            if self.tracked_n == 1: self.trial_data.post_event_time = self.time_passed(self.movement_timer) - self.trial_data.m_event_occurs
+            movement_time = self.time_passed(self.movement_timer)
+            if self.tracked_n == 1: self.trial_data.post_event_time = movement_time - self.trial_data.m_event_occurs
             if self.cond == 'CONTROL' or self.tracked_n == 1:
                 return self.rGetResponse
             else:
-                self.trial_data.m_start_event_search = self.time_passed(self.movement_timer)
+                self.trial_data.m_start_event_search = movement_time
                 return self.rEvent
     
 
@@ -232,10 +268,7 @@ class Trial():
             self.drawn_stim = [c.stims, c.partitions, c.fixation]
         
         # If stimulus starts to cross OR change direction
-        if moveStimuli(c.partitions, c.stims,
-                       cross=(True if self.cond == 'CROSSED' else False),
-                       change=(True if self.cond == 'CHANGED' else False),
-                       trial_data=self.trial_data, time_on_flip=self.time_passed(timer=self.trial_timer)):
+        if self.move_event_stimuli(c.partitions, c.stims, time_on_flip=self.time_passed(timer=self.trial_timer)):
             self.trial_data.m_event_occurs = self.time_passed(self.movement_timer)
             self.trial_data.total_search_time = self.trial_data.m_event_occurs - self.trial_data.m_start_event_search
             return self.rTrackStimuli  # loop back to second phase of tracking
@@ -244,6 +277,7 @@ class Trial():
     def rGetResponse(self, first_access: bool=False):
         if p.skip_response: return 'complete'
         if first_access:    
+            self.record_frames(False)
             mouse.setPos((0,0))
             c.fixation.color='black'
             self.trial_data.total_move_time = win.getFutureFlipTime(clock=self.movement_timer)
@@ -274,7 +308,8 @@ class Trial():
     
 
     def rTimeout(self, first_access: bool=False):
-        self.drawn_stim = [c.timeout_txt]
+        if first_access:
+            self.drawn_stim = [c.timeout_txt]
         if listen.listen(mouse.getPressed()[0], id='timeout'): return self.rEndTrial
 
 
@@ -285,15 +320,11 @@ class Trial():
             c.feedback_stims[1].pos = self.queried_pos
             fade.append(c.feedback_stims[1])
 
-            # Work out attributes of text
-            txt_height = 0.03
-            txt_buffer = txt_height * 1.2
-            txt_on_right = 1 if self.queried_stim.partition_id[0] == 1 else -1
-            x_pos = (c.partitions.inner_width + c.partitions.spacing[0])/2*txt_on_right
-            bottom_y_pos = c.partitions[self.queried_stim.partition_id].max_y + txt_height/2 + (txt_buffer-txt_height)
+            x_pos, bottom_y_pos = self.txt_x_pos, self.txt_bottom_y_pos
 
             # Assign distance to trial_data
-            response_distance = mag(self.response_pos-self.queried_pos)
+            dx, dy = self.response_pos-self.queried_pos
+            response_distance = math.sqrt(dx*dx + dy*dy)
             response_overlap = max((1-(response_distance/(s.r*2))), 0)  # can't be negative
             self.trial_data.response_distance = response_distance
             self.trial_data.response_overlap = response_overlap
@@ -317,18 +348,19 @@ class Trial():
 
                 if p.run_lottery:
                     feedback_txt.pos = (x_pos, bottom_y_pos)
-                    self.drawn_stim.append(feedback_txt)
+                    self.drawn_stim = self.drawn_stim + [feedback_txt]
                     fade.append(feedback_txt)
-                distance_y_pos = bottom_y_pos+txt_buffer
+                distance_y_pos = bottom_y_pos+self.txt_buffer
             else:
                 distance_y_pos = bottom_y_pos
 
             # Show distance if parameter set to True
             if p.show_overlap:
-                current_txt = c.distance_txt[percent_overlap]
+                current_txt = c.distance_txt
+                current_txt.text = f"{percent_overlap}% overlap"
                 current_txt.pos = (x_pos, distance_y_pos)
                 fade.append(current_txt)
-                self.drawn_stim.append(current_txt)
+                self.drawn_stim = self.drawn_stim + [current_txt]
         if listen.listen(mouse.getPressed()[0], id='feedback'): return self.rEndTrial
     
 